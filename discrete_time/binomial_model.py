@@ -7,6 +7,118 @@ Author: Sam Kelemen
 Last modified: 02/20/2025
 """
 from collections.abc import Callable
+from functools import lru_cache
+
+import numpy as np
+from numpy.typing import ArrayLike
+
+try:
+    from numba import njit, prange
+    _HAS_NUMBA = True
+except ImportError:
+    # Numba is optional, fall back to numpy implementations of the kernels
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+        return lambda func: func
+
+    _HAS_NUMBA = False
+
+
+def _layer(data: np.ndarray, layer_starts: np.ndarray, t: int) -> np.ndarray:
+    """
+    (ndarray)         data: The flat data of a binary tree
+    (ndarray) layer_starts: The index of the first node of each layer
+    (int)                t: the time step of the model, indexed from 0
+
+    Returns a view of the nodes at time t, ordered by
+    the number of up steps.
+    """
+    return data[layer_starts[t]:layer_starts[t + 1]]
+
+
+def _backward_induction(V, layer_starts, qu, qd, disc):
+    """
+    (float64[:])        V: The flat binary tree, with the last layer
+        already filled with the payoff of the claim
+    (int64[:]) layer_starts: The index of the first node of each layer
+    (float)            qu: martingale probability of upwards movement
+    (float)            qd: martingale probability of downwards movement
+    (float)          disc: the one period discount factor
+
+    Fills the layers of V before time T, in place, with the
+    discounted expected payoff under the martingale measure,
+    one vectorized layer at a time.
+    """
+    T = len(layer_starts) - 2
+    for t in range(T - 1, -1, -1):
+        V_next = _layer(V, layer_starts, t + 1)
+        _layer(V, layer_starts, t)[:] = disc * (qu * V_next[1:] + qd * V_next[:-1])
+
+
+@njit(cache=True, fastmath=True)
+def _hedge(V_u, V_d, S, u, d, disc):
+    """
+    (float)  V_u: value of the claim after an up movement
+    (float)  V_d: value of the claim after a down movement
+    (float)    S: the price of the stock at the node
+    (float)    u: up movement value
+    (float)    d: down movement value
+    (float) disc: the one period discount factor
+
+    Returns the (x, y) pair of the hedging portfolio. Also accepts
+    numpy arrays for a whole layer when running without numba.
+    """
+    x = disc * (u * V_d - d * V_u) / (u - d)
+    y = (V_u - V_d) / ((u - d) * S)
+    return x, y
+
+
+def _hedges(vp_data, price_data, layer_starts, T, u, d, disc, x_out, y_out):
+    """
+    (float64[:])      vp_data: The flat value process of the claim
+    (float64[:])   price_data: The flat price process of the stock
+    (int64[:])   layer_starts: The index of the first node of each layer
+    (int)                   T: number of periods
+    (float)                 u: up movement value
+    (float)                 d: down movement value
+    (float)              disc: the one period discount factor
+    (float64[:])        x_out: The flat tree to fill with bond holdings
+    (float64[:])        y_out: The flat tree to fill with stock holdings
+
+    Fills x_out and y_out with the hedging portfolio at every node
+    before time T, one vectorized layer at a time.
+    """
+    for t in range(T):
+        V_next = _layer(vp_data, layer_starts, t + 1)
+        x, y = _hedge(V_next[1:], V_next[:-1], _layer(price_data, layer_starts, t), u, d, disc)
+        _layer(x_out, layer_starts, t)[:] = x
+        _layer(y_out, layer_starts, t)[:] = y
+
+
+if _HAS_NUMBA:
+    # Each node only reads from the layer after it and writes its own
+    # entries, so the nodes within a layer are computed in parallel.
+    @njit(cache=True, fastmath=True, parallel=True)
+    def _backward_induction(V, layer_starts, qu, qd, disc):
+        """Numba kernel for the numpy _backward_induction defined above."""
+        T = len(layer_starts) - 2
+        for t in range(T - 1, -1, -1):
+            start = layer_starts[t]
+            next_start = layer_starts[t + 1]
+            for k in prange(t + 1):
+                V[start + k] = disc * (qu * V[next_start + k + 1] + qd * V[next_start + k])
+
+    @njit(cache=True, fastmath=True, parallel=True)
+    def _hedges(vp_data, price_data, layer_starts, T, u, d, disc, x_out, y_out):
+        """Numba kernel for the numpy _hedges defined above."""
+        for t in range(T):
+            start = layer_starts[t]
+            next_start = layer_starts[t + 1]
+            for k in prange(t + 1):
+                x_out[start + k], y_out[start + k] = _hedge(
+                    vp_data[next_start + k + 1], vp_data[next_start + k],
+                    price_data[start + k], u, d, disc)
 
 
 class BinaryTree:
@@ -16,7 +128,10 @@ class BinaryTree:
             or date of contract epiration).
         """
         num_nodes = int((T + 1) * (T + 2) / 2)
-        self.data = [None] * num_nodes
+        self.data = np.empty(num_nodes, dtype=np.float64)
+
+        # layer_starts[t] is the index of the first node at time t
+        self.layer_starts = np.arange(T + 2).cumsum()
 
     def _bt_index(self, t: int, k: int) -> int:
         """
@@ -26,7 +141,16 @@ class BinaryTree:
         Returns the index of the node at time t, 
         after k up steps. t is indexed starting at 0.
         """
-        return int((t * (t + 1) / 2) + k)
+        return int(self.layer_starts[t] + k)
+
+    def layer(self, t: int) -> np.ndarray:
+        """
+        (int) t: the time step of the model, indexed from 0
+
+        Returns a view of the nodes at time t, ordered by
+        the number of up steps.
+        """
+        return _layer(self.data, self.layer_starts, t)
 
     def set_data(self, value: float, t: int, k: int) -> None:
         """
@@ -50,6 +174,41 @@ class BinaryTree:
         index = self._bt_index(t, k)
         return self.data[index]
 
+class HedgePair:
+    def __init__(self, T: int):
+        """
+        (int T): The number of time steps for the model 
+            or date of contract epiration).
+
+        Stores the bond holdings, x, and the stock holdings, y, of
+        the hedging portfolios in two separate binary trees.
+        """
+        self.x = BinaryTree(T)
+        self.y = BinaryTree(T)
+
+    def set_data(self, value: tuple[float, float], t: int, k: int) -> None:
+        """
+        (tuple) value: the (x, y) pair of the hedging portfolio
+        (int) t: the time step of the model, indexed from 0
+        (int) k: the number of up steps to get to the node
+
+        Sets the hedging portfolio of the node at time t,
+        after k up steps.
+        """
+        x, y = value
+        self.x.set_data(x, t, k)
+        self.y.set_data(y, t, k)
+
+    def get_data(self, t: int, k: int) -> tuple[float, float]:
+        """
+        (int) t: the time step of the model, indexed from 0
+        (int) k: the number of up steps to get to the node
+
+        Gets the (x, y) pair of the hedging portfolio of the
+        node at time t, after k up steps.
+        """
+        return self.x.get_data(t, k), self.y.get_data(t, k)
+
 class BinomialModel:
     def __init__(self, T: int, u: float, d: float, S: float, R: float, pu: float = 0.5, pd: float = 0.5) -> None:
         """
@@ -73,100 +232,168 @@ class BinomialModel:
         self.S = S
         self.R = R
 
+        # The martingale measure and discount factor depend only on u, d and R
+        self._qu = ((1 + self.R) - self.d) / (self.u - self.d)
+        self._qd = (self.u - (1 + self.R)) / (self.u - self.d)
+        self._disc = 1.0 / (1.0 + self.R)
+
+        # Assert that {qu, qd} sums to one.
+        assert abs(self._qu + self._qd - 1) < 1e-12
+
+        # Powers of u and d for up to T steps, shared by every layer
+        self._u_pow = np.power(float(self.u), np.arange(T + 1))
+        self._d_pow = np.power(float(self.d), np.arange(T + 1))
+
         self.price_process = BinaryTree(T)
         self._compute_price_process() # Now, fill the null value with the actual prices
 
+        # Value processes of the two most recently hedged claims, see clear_cache
+        self._value_process_lru = lru_cache(maxsize=2)(self.compute_value_process)
+
+    def clear_cache(self) -> None:
+        """
+        Releases the value processes cached by the hedging methods.
+        Each cached tree holds (T + 1)(T + 2) / 2 floats.
+        """
+        self._value_process_lru.cache_clear()
+
     def compute_martingale_measure(self) -> tuple[float, float]:
         """
-        Calculate the martingale measure for the binomial
-        model.
+        Returns the martingale measure for the binomial
+        model, computed once when the model is constructed.
         """
-        qu = ((1 + self.R) - self.d) / (self.u - self.d)
-        qd = (self.u - (1 + self.R)) / (self.u - self.d)
-        return qu, qd
+        return self._qu, self._qd
 
     def _compute_price_process(self) -> None:
         """
         Compute price of stock for all nodes in the binary tree.
         """
+        data, layer_starts = self.price_process.data, self.price_process.layer_starts
+
         # Iterate over the layers of the binary tree
         for t in range(self.T + 1):
-            # Iterate over the nodes in the layer of the bt
-            for k in range(t + 1):
-                # t - k is number of down steps
-                price_process = self.S * (self.u ** k) * (self.d ** (t - k))
-                self.price_process.set_data(price_process, t, k)
+            # Node k of the layer has k up steps and t - k down steps
+            _layer(data, layer_starts, t)[:] = self.S * self._u_pow[:t + 1] * self._d_pow[t::-1]
 
-    def _compute_value_at_node(self, t: int, k: int, phi: Callable[[float], float], value_process: BinaryTree) -> float:
+    def compute_value_process(self, phi: Callable[[np.ndarray], np.ndarray]) -> BinaryTree:
         """
-        (int) t       : the time step of the model, indexed from 0
-        (int) k       : the number of up steps to get to the node
-        (function) phi: The contract function for the contingent claim
+        (function) phi: The contract function for the contingent claim,
+            which must accept a numpy array of asset prices
 
-        Computes the value of the node at time t after k up steps.
+        Computes the value process for the binomial model.
         """
-        # Compute and return the value if at the expiration date, T
-        if (t == self.T):
-            price_process = self.price_process.get_data(t, k)
-            return phi(price_process)
+        value_process = BinaryTree(self.T)
+        data, layer_starts = value_process.data, value_process.layer_starts
+
+        # The value at the expiration date, T, is the payoff of the claim
+        prices_T = _layer(self.price_process.data, self.price_process.layer_starts, self.T)
+        _layer(data, layer_starts, self.T)[:] = phi(prices_T)
 
-        # Compute at return the value if not at the expiration date, T    
-        qu, qd = self.compute_martingale_measure()
-        payoff = qu * value_process.get_data(t + 1, k + 1) + qd * value_process.get_data(t + 1, k)
-        return (1 / 1 + self.R) * (payoff) # Discounted payoff is the value
+        # Discounted expected payoff under the martingale measure is the value
+        _backward_induction(data, layer_starts, self._qu, self._qd, self._disc)
 
-    def compute_value_process(self, phi: Callable[[float], float]) -> BinaryTree:
+        return value_process
+
+    def _terminal_prices(self) -> np.ndarray:
         """
-        (function) phi: The contract function for the contingent claim
+        Computes the price of stock at the expiration date, T,
+        ordered by the number of up steps.
+        """
+        return self.S * self._u_pow * self._d_pow[::-1]
 
-        Computes the value process for the binomial model.
+    def price_european(self, phi: Callable[[np.ndarray], np.ndarray]) -> float:
         """
-        value_process = BinaryTree(self.T)
+        (function) phi: The contract function for the contingent claim,
+            which must accept a numpy array of asset prices
 
-        # Iterate over the layers of the binary tree
-        for t in range(self.T, -1, -1):
-            # Iterate over the nodes in the layer of the bt
-            for k in range(t, -1, -1):
-                value = self._compute_value_at_node(t, k, phi, value_process)
-                value_process.set_data(value, t, k)
+        Computes the price at time 0 of the contingent claim. Only
+        one layer of the value process is held in memory at a time.
+        """
+        # The value at the expiration date, T, is the payoff of the claim
+        prices_T = self._terminal_prices()
+        V = np.broadcast_to(phi(prices_T), prices_T.shape).astype(np.float64)
 
-        return value_process
+        # Overwrite the front of V with each earlier layer
+        for t in range(self.T - 1, -1, -1):
+            V[:t + 1] = self._disc * (self._qu * V[1:t + 2] + self._qd * V[:t + 1])
+
+        return float(V[0])
+
+    def price_european_chain(self, payoff: Callable[[np.ndarray, np.ndarray], np.ndarray], strikes: ArrayLike) -> np.ndarray:
+        """
+        (function)  payoff: The contract function taking the asset
+            price and the strike price, ie. contingent_claim.put_option
+        (array_like) strikes: The strike prices to price the claim at
 
-    def compute_hedging_portfolio_at_node(self, t: int, k: int, phi: Callable[[float], float]) -> tuple[float, float]:
+        Computes the prices at time 0 of the contingent claim for
+        every strike in one backward induction.
+        """
+        strikes = np.atleast_1d(np.asarray(strikes, dtype=np.float64))
+        prices_T = self._terminal_prices()
+
+        # Row k of V holds the value after k up steps for every strike
+        V = np.broadcast_to(payoff(prices_T[:, None], strikes[None, :]),
+                            (prices_T.size, strikes.size)).astype(np.float64)
+
+        for t in range(self.T - 1, -1, -1):
+            V = self._disc * (self._qu * V[1:] + self._qd * V[:-1])
+
+        return V[0]
+
+    def _value_process_cached(self, phi: Callable[[np.ndarray], np.ndarray]) -> BinaryTree:
+        """
+        (function) phi: The contract function for the contingent claim
+
+        Returns the value process for phi, reusing a cached tree
+        when phi is hashable.
+        """
+        try:
+            hash(phi)
+        except TypeError:
+            return self.compute_value_process(phi)
+        return self._value_process_lru(phi)
+
+    def compute_hedging_portfolio_at_node(self, t: int, k: int, phi: Callable[[np.ndarray], np.ndarray]) -> tuple[float, float]:
         """
         (int) t       : the time step of the model, indexed from 0
         (int) k       : the number of up steps to get to the node
-        (function) phi: The contract function for the contingent claim
+        (function) phi: The contract function for the contingent claim,
+            which must accept a numpy array of asset prices
 
         Computes the hedging profile for a given contingent claim at
         time t and after k up steps.
         """
-        value_process = self.compute_value_process(phi)
+        value_process = self._value_process_cached(phi)
+        return self._hedge_from_vp(t, k, value_process)
+
+    def _hedge_from_vp(self, t: int, k: int, value_process: BinaryTree) -> tuple[float, float]:
+        """
+        (int) t                   : the time step of the model, indexed from 0
+        (int) k                   : the number of up steps to get to the node
+        (BinaryTree) value_process: The precomputed value process of the claim
 
+        Computes the hedging profile at time t and after k up steps
+        from an already computed value process.
+        """
         V_u = value_process.get_data(t + 1, k + 1)
         V_d = value_process.get_data(t + 1, k)
-        x = (1 / 1 + self.R) * (self.u * V_d - self.d * V_u) / (self.u - self.d)
-
         S = self.price_process.get_data(t, k)
-        y = (1 / S) * (V_u - V_d) / (self.u - self.d)
+        return _hedge(V_u, V_d, S, self.u, self.d, self._disc)
 
-        return x, y
-
-    def compute_all_hedging_portfolios(self, phi: Callable[[float], float]) -> BinaryTree:
+    def compute_all_hedging_portfolios(self, phi: Callable[[np.ndarray], np.ndarray]) -> HedgePair:
         """
-        (function) phi: The contract function for the contingent claim
+        (function) phi: The contract function for the contingent claim,
+            which must accept a numpy array of asset prices
 
         Computes the hedging pofile for the given contingent claim
         at all nodes in the tree for the event space.
         """
-        hedging_portfolios = BinaryTree(self.T - 1)
+        hedging_portfolios = HedgePair(self.T - 1)
+        value_process = self._value_process_cached(phi)
 
-        # Iterate over the layers of the binary tree (excluding the last layer)
-        for t in range(self.T):
-            # Iterate over the nodes in the layer of the bt
-            for k in range(t + 1):
-                x, y = self.compute_hedging_portfolio_at_node(t, k, phi)
-                hedging_portfolios.set_data((x, y), t, k)
+        # Fill every layer of the binary tree (excluding the last layer)
+        _hedges(value_process.data, self.price_process.data, value_process.layer_starts,
+                self.T, self.u, self.d, self._disc, hedging_portfolios.x.data, hedging_portfolios.y.data)
 
         return hedging_portfolios
 
@@ -4,21 +4,23 @@ Contains functions for various derivatives contracts.
 Author: Sam Kelemen
 Last modified: 02/20/2025
 """
+import numpy as np
+from numpy.typing import ArrayLike
 
-def put_option(asset_price:float, strike_price:float):
+def put_option(asset_price: ArrayLike, strike_price: float) -> np.ndarray:
     """
     A European put option.
 
-    (float) asset_price: The current price of the asset
+    (array_like) asset_price: The current price(s) of the asset
     (float) strike_price: The strike price of the put option
     """
-    return max(0, strike_price - asset_price)
+    return np.maximum(0.0, strike_price - np.asarray(asset_price))
 
-def call_option(asset_price:float, strike_price:float):
+def call_option(asset_price: ArrayLike, strike_price: float) -> np.ndarray:
     """
     A European call option.
 
-    (float) asset_price: The current price of the asset
+    (array_like) asset_price: The current price(s) of the asset
     (float) strike_price: The strike price of the put option
     """
-    return max(0, asset_price - strike_price)
+    return np.maximum(0.0, np.asarray(asset_price) - strike_price)
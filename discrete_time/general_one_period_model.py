@@ -4,7 +4,9 @@ Chapter 3 of 'Arbitrage Theory in Continuous Time'
 """
 import numpy as np
 from numpy.typing import NDArray
+from scipy.linalg import qr
 from scipy.optimize import linprog
+from scipy.sparse import csr_matrix, vstack as sp_vstack
 
 
 class GeneralOnePeriodModel:
@@ -35,10 +37,7 @@ class GeneralOnePeriodModel:
         """
         Computes the matrix, using the first asset as the numeraire.
         """
-        normalized_matrix = np.copy(matrix)
-        for col in range(normalized_matrix.shape[1]):
-            normalized_matrix[:, col] /= normalized_matrix[0, col]
-        return normalized_matrix
+        return matrix / matrix[0, :]
 
     def is_complete(self) -> bool:
         """
@@ -48,14 +47,20 @@ class GeneralOnePeriodModel:
         m is the size of the probability space, then the market
         is complete.
 
-        Note: Implemented with numpy.linalg.rank, which approximates
-        the SVD of the D matrix to find the rank. This is done
-        numerically and may incure associated errors.
+        Note: Implemented with a column pivoted QR decomposition of
+        the D matrix, counting the diagonal entries of R above a
+        tolerance to find the rank. This is done numerically and
+        may incure associated errors.
         """
-        D = self.D_bar[:, :-1]
-        probability_space_size = D.shape()[1]
+        D = self.get_D()
+        probability_space_size = D.shape[1]
 
-        if np.linalg.matrix_rank(D) == probability_space_size:
+        R = qr(D, mode='r', pivoting=True)[0]
+        R_diag = np.abs(np.diag(R))
+        tol = R_diag.max(initial=0.0) * max(D.shape) * np.finfo(R.dtype).eps
+        rank = int(np.sum(R_diag > tol))
+
+        if rank == probability_space_size:
             return True
         return False
 
@@ -67,20 +72,32 @@ class GeneralOnePeriodModel:
         Utilizes the Thm that the market is arbitrage free iff
         there exists a martingale measure.
 
-        Approaches this problem with linear programming.
+        Approaches this problem with linear programming, using
+        the HiGHS dual simplex solver on a sparse constraint matrix.
         """
         D_z = self.normalize(self.get_D())
         S_0 = self.get_S_0().flatten()
 
+        # A probability vector q makes each row of D_z q a convex
+        # combination of that row, so no martingale measure exists
+        # if some price lies clearly outside the range of its row.
+        # The tolerance matches the LP's feasibility tolerance,
+        # scaled by the size of the row.
+        row_min = D_z.min(axis=1)
+        row_max = D_z.max(axis=1)
+        tol = 1e-7 * np.maximum(1.0, np.abs(D_z).max(axis=1))
+        if np.any(row_max < S_0 - tol) or np.any(row_min > S_0 + tol):
+            return False
+
         # Objective function should have all zero coefficients
         c = np.zeros(shape=D_z.shape[1])
 
         # Constraint equation
-        A_eq = np.vstack( (D_z, np.ones((1, D_z.shape[1]))) )
+        A_eq = sp_vstack( (csr_matrix(D_z), csr_matrix(np.ones((1, D_z.shape[1])))), format="csr" )
         b_eq = np.concatenate( (S_0, np.array([1])) )
         q_bounds = (0, 1)
 
-        solution = linprog(c, A_eq=A_eq, b_eq=b_eq, bounds=q_bounds)
+        solution = linprog(c, A_eq=A_eq, b_eq=b_eq, bounds=q_bounds, method="highs-ds")
 
         if solution.status == 0:
             return True